@@ -1,183 +1,629 @@
 #!/usr/bin/env python3
 
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import codecs
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from contextlib import asynccontextmanager
+import functools
+import hashlib
+import httpx
+from lxml import etree, html
+from lxml.cssselect import CSSSelector
 from urllib.parse import urljoin, urlparse
+import math
+import os
+import random
+import re
+import shelve
 import time
-import sys
+from urllib.robotparser import RobotFileParser
 from collections import deque
 
+# Maximum number of requests in flight at once
+CONCURRENCY = 4
+# Minimum seconds between requests to one host, unless robots.txt sets a Crawl-Delay,
+# plus up to CRAWL_JITTER seconds of random delay. The default keeps to the original
+# serial crawler's one request per second, however many workers share the host.
+DEFAULT_CRAWL_DELAY = 1.0
+CRAWL_JITTER = 0.5
+REQUEST_TIMEOUT = httpx.Timeout(10)
+# Failed connections and these transient statuses are retried, waiting
+# RETRY_BACKOFF * 2**attempt seconds between status retries
+MAX_RETRIES = 3
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+RETRY_BACKOFF = 0.3
+# A 429 is retried after the host's Retry-After, and doubles its crawl delay for the
+# rest of the crawl. Both are at least DEFAULT_CRAWL_DELAY, and capped so one host
+# can't stall the workers indefinitely.
+THROTTLED_STATUS = 429
+MAX_CRAWL_DELAY = 60
+# Cached pages younger than this are replayed without a request. Older ones are
+# revalidated with a conditional GET, which costs a 304 instead of a download and
+# parse when the page hasn't changed.
+CACHE_FRESH_FOR = 12 * 60 * 60
+NOT_MODIFIED_STATUS = 304
+# Response headers saved with a cached page, and the request headers that send them back
+VALIDATOR_HEADERS = (('ETag', 'If-None-Match'), ('Last-Modified', 'If-Modified-Since'))
+# Returned by extract_content when the server says the cached copy is still current
+NOT_MODIFIED = object()
+# Returned by extract_content when the page couldn't be fetched for a reason that may
+# pass (network error, server error), so a cached copy is replayed rather than dropped.
+# Only these statuses are taken as the page really being gone.
+FETCH_FAILED = object()
+GONE_STATUSES = frozenset({404, 410})
+# Processes for the CPU-bound parse stage. lxml only releases the GIL while feeding
+# the parser; link resolution and text extraction are Python-level, so threads
+# would spend most of a parse waiting on each other.
+PARSE_WORKERS = os.cpu_count() or 1
+# Response bodies are read and parsed in chunks of this size
+CHUNK_SIZE = 65536
+WRITE_BUFFER_SIZE = 1 << 20
+# Pages larger than this are abandoned mid-download rather than parsed
+MAX_PAGE_BYTES = 5_000_000
+
+# Sizing for the Bloom filters of queued and visited URLs: the share of links that
+# get wrongly treated as already seen (and so never crawled) stays around these rates
+EXPECTED_LINKS_PER_PAGE = 100
+ENQUEUED_ERROR_RATE = 1e-7
+VISITED_ERROR_RATE = 1e-7
+# Pages whose text matches an earlier page once markup and digits are removed
+# (version toggles, language variants) are skipped before parsing. Digits and
+# whitespace are deleted with bytes.translate, several times faster than in the regex.
+DUPLICATE_MARKUP_RE = re.compile(rb'<[^>]*>')
+DUPLICATE_NOISE_BYTES = b'0123456789 \t\n\r\x0b\x0c'
+SEEN_CONTENT_ERROR_RATE = 1e-7
+
+# OpenAPI operation keys and how they are shown in headings
+HTTP_METHODS = {method: method.upper() for method in
+                ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')}
+
+# Output file separators
+SEP = "=" * 50 + "\n\n"
+RULE = "-" * 50 + "\n"
+
+# Where to look for a <meta charset> when the Content-Type header has none
+CHARSET_PRESCAN_BYTES = 1024
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+# Markup readable as ASCII can't really be UTF-16, so browsers take a declared UTF-16 as UTF-8
+UTF16_RE = re.compile(r'utf-?16', re.IGNORECASE)
+
+STOPLIGHT_MARKER = b'<elements-api'
+PROMO_TEXT = "Stay organized with collections"
+PROMO_MARKER = PROMO_TEXT.encode()
+# Bytes kept from the previous chunk so markers split across chunks are still found
+MARKER_OVERLAP = max(len(STOPLIGHT_MARKER), len(PROMO_MARKER)) - 1
+# Elements directly holding a text node that mentions the promo banner
+PROMO_XPATH = etree.XPath('//text()[contains(., $text)]/..')
+# Non-content elements, dropped from the tree while the page is being parsed.
+# Nothing is read from <head> (the title comes from the first <h1>), and
+# noscript/template/svg subtrees never hold docs text.
+PRUNED_TAGS = ('nav', 'footer', 'aside', 'script', 'style',
+               'head', 'noscript', 'template', 'svg')
+
+# Keywords for next/forward navigation, matched against lowercased link text,
+# aria-label and class
+NEXT_KEYWORDS_RE = re.compile('next|→|>|continue|forward|siguiente')
+NEXT_CLASS_RE = re.compile('next|forward')
+# URLs that look like the next step of a guide get crawled first
+PRIORITY_URL_RE = re.compile('next|plan|step|part', re.IGNORECASE)
+
+# First element with 'content' anywhere in its class, in any case
+CONTENT_CLASS_XPATH = etree.XPath('(//*[contains(translate(@class, "CONTENT", "content"), "content")])[1]')
+
+# href values of every link under an element, returned as plain strings so no
+# Python object is created per <a> element
+HREFS_XPATH = etree.XPath('.//a/@href', smart_strings=False)
+# Absolute http(s) URLs that urljoin would return unchanged: no empty query or
+# fragment, no path parameters and no whitespace for it to strip
+PLAIN_ABSOLUTE_URL_RE = re.compile(r'https?://[^/?#;\s]+(?:/[^?#;\s]*)?(?:\?[^#\s]+)?(?:#\S+)?')
+
+# Elements whose text is kept from the content area, in document order
+CONTENT_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'td', 'pre', 'code')
+# Markdown prefix for each heading level
+HEADING_PREFIXES = {f'h{level}': f"\n{'#' * level} " for level in range(1, 7)}
+
+# Look for navigation arrows and buttons with specific classes/attributes
+NAV_SELECTORS = [
+    'a[aria-label*="next"]',
+    'a[aria-label*="Next"]',
+    'a[class*="next"]',
+    'a[class*="pagination"]',
+    '.next a',
+    '.pagination a',
+    '[class*="nav"] a',
+    # Footer navigation patterns
+    'nav[class*="footer"] a',
+    '.md-footer a',
+    'footer nav a',
+    'footer a',
+    # Material Design footer patterns
+    '.md-footer__link--next',
+    'a.md-footer__link--next',
+    # Generic footer navigation
+    '[class*="footer"] a[class*="next"]',
+    '[class*="footer"] a[aria-label*="next"]',
+    '[class*="footer"] a[aria-label*="Next"]',
+    # Documentation navigation patterns
+    '.doc-nav a',
+    '.docs-nav a',
+    '.page-nav a',
+    '[class*="page-navigation"] a',
+    '[class*="doc-navigation"] a'
+]
+# Compiled to a single XPath once, so each page is matched in one tree walk
+NAV_SELECTOR = CSSSelector(", ".join(NAV_SELECTORS), translator='html')
+
+def contains_marker(marker, tail, chunk):
+    """Check a chunk of raw bytes for marker, including a match that began in tail"""
+    return marker in chunk or marker in tail + chunk[:len(marker) - 1]
+
+class PageSignature:
+    """Digest of a page's raw bytes with tags, digits and whitespace removed.
+
+    Fed chunk by chunk as the page downloads, so it never needs the whole page at
+    once. A tag left open at the end of a chunk is held back until it closes.
+    """
+    
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._pending = b''
+    
+    @staticmethod
+    def _strip(data):
+        return DUPLICATE_MARKUP_RE.sub(b'', data).translate(None, DUPLICATE_NOISE_BYTES)
+    
+    def update(self, chunk):
+        # Everything before the first '<' after the last '>' can be stripped now; from
+        # there on, a tag may still be closed by a later chunk
+        data = self._pending + chunk
+        cut = data.find(b'<', data.rfind(b'>') + 1)
+        if cut == -1:
+            self._pending = b''
+        else:
+            data, self._pending = data[:cut], data[cut:]
+        self._hash.update(self._strip(data))
+    
+    def digest(self):
+        final = self._hash.copy()
+        final.update(self._strip(self._pending))
+        return final.digest()
+
+def absolute_url(base, href):
+    """urljoin(base, href), skipping the URL parsing when href is already a plain absolute URL"""
+    if PLAIN_ABSOLUTE_URL_RE.fullmatch(href):
+        return href
+    return urljoin(base, href)
+
+def element_text(element):
+    """All text inside element, serialized by libxml2 in one call (faster than text_content())"""
+    return etree.tostring(element, method='text', encoding='unicode', with_tail=False)
+
+@functools.lru_cache(maxsize=None)
+def parser_encoding(charset):
+    """charset, or its Python codec's canonical name, if libxml2 can decode it; else None.
+
+    libxml2 knows a different set of names than Python: it rejects spellings like
+    latin-1 or koi8_r, which codecs.lookup() accepts.
+    """
+    names = [charset]
+    try:
+        names.append(codecs.lookup(charset).name)
+    except LookupError:
+        pass
+    for name in names:
+        try:
+            etree.HTMLParser(encoding=name)
+            return name
+        except LookupError:
+            pass
+    return None
+
+def detect_encoding(head):
+    """Charset declared by a <meta> tag near the start of a page, else UTF-8.
+
+    Used when the response headers don't name a usable one; libxml2 would otherwise
+    assume Latin-1 for a chunked feed.
+    """
+    match = META_CHARSET_RE.search(head)
+    if match:
+        declared = match.group(1).decode('ascii')
+        if UTF16_RE.match(declared):
+            return 'utf-8'
+        charset = parser_encoding(declared)
+        if charset is not None:
+            return charset
+    return 'utf-8'
+
+def failed_result(error):
+    """What extract_content returns for a page whose fetch raised error"""
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in GONE_STATUSES:
+        return None, [], []
+    return FETCH_FAILED
+
+def prune_elements(parser):
+    """Drop every pruned element the parser has finished since the last call"""
+    for _, element in parser.read_events():
+        element.drop_tree()
+
+def parse_page(url, chunks, encoding, has_promo):
+    """Parse a downloaded page into its title, text blocks and candidate links.
+
+    Runs in a worker process, so it only touches its arguments and builds its own
+    parser there. The worker's copy of chunks is emptied as it is fed, so the worker
+    doesn't hold the raw page alongside the finished tree; the crawler process keeps
+    its own copy until the parse returns. Links are made absolute but not yet
+    filtered against the crawl.
+    Returns (title, text_content, content_links, next_buttons, nav_links), or None
+    if the page has no content area.
+    """
+    # A header charset libxml2 can't decode falls back to the page's own declaration
+    if encoding is not None:
+        encoding = parser_encoding(encoding)
+    if encoding is None:
+        encoding = detect_encoding(chunks[0][:CHARSET_PRESCAN_BYTES] if chunks else b'')
+    
+    # Drop navigation, footers, and other non-content elements as soon as they close
+    # so they never pile up in the tree
+    parser = etree.HTMLPullParser(events=('end',), tag=PRUNED_TAGS, encoding=encoding,
+                                  remove_comments=True, remove_pis=True)
+    parser.set_element_class_lookup(html.HtmlElementClassLookup())
+    for i, chunk in enumerate(chunks):
+        chunks[i] = None
+        parser.feed(chunk)
+        prune_elements(parser)
+    root = parser.close()
+    prune_elements(parser)
+    
+    # Remove promotional content (if any), skipping the tree search when the
+    # banner text never appeared in the raw page. The banner can be split across
+    # inline elements, so walk up from each element holding the text to the nearest
+    # one whose text starts with it; usually that is the holder itself.
+    if has_promo:
+        for element in PROMO_XPATH(root, text=PROMO_TEXT):
+            parent = element
+            # Stop at <body>, or at the top of a subtree an earlier match already removed
+            while parent.tag != 'body' and parent.getparent() is not None:
+                if element_text(parent).strip().startswith(PROMO_TEXT):
+                    parent.drop_tree()
+                    break
+                parent = parent.getparent()
+    
+    # Find main content area. Tag-filtered iter() returns at once when the page has no
+    # such element, so only the class search ever has to walk the whole tree.
+    content_area = next(root.iter('main'), None)
+    if content_area is None:
+        content_area = next(root.iter('article'), None)
+    if content_area is None:
+        content_area = next(iter(CONTENT_CLASS_XPATH(root)), None)
+    if content_area is None:
+        content_area = next(root.iter('body'), None)
+    
+    # Flushed at once, since a worker process's stdout is block-buffered when redirected
+    print(f"  → Content area found: {content_area.tag if content_area is not None else None}",
+          flush=True)
+    
+    if content_area is None:
+        return None
+        
+    # Extract text content
+    title = root.find('.//h1')
+    title_text = element_text(title).strip() if title is not None else url
+    
+    # Get all text content, preserving some structure
+    text_content = []
+    elements = list(content_area.iterdescendants(CONTENT_TAGS))
+    print(f"  → Found {len(elements)} content elements", flush=True)
+    
+    for elem in elements:
+        text = element_text(elem).strip()
+        if text and len(text) > 10:  # Filter out very short text
+            prefix = HEADING_PREFIXES.get(elem.tag)
+            if prefix:
+                text_content.append(prefix + text + "\n")
+            else:
+                text_content.append(text)
+    
+    print(f"  → Extracted {len(text_content)} text blocks", flush=True)
+    
+    # Links to other pages from within the content
+    content_links = [absolute_url(url, href) for href in HREFS_XPATH(content_area)]
+    
+    # Also look for Next buttons and pagination links in the entire page
+    next_buttons = [absolute_url(url, a.get('href')) for a in root.iter('a')
+                    if a.get('href') is not None and 'next' in element_text(a).lower()]
+    
+    # Look for navigation arrows and buttons with specific classes/attributes
+    nav_links = []
+    for nav_link in NAV_SELECTOR(root):
+        href = nav_link.get('href')
+        if href:
+            # Check if this looks like a next/forward navigation
+            link_text = element_text(nav_link).strip().lower()
+            link_classes = nav_link.get('class', '').lower()
+            aria_label = nav_link.get('aria-label', '').lower()
+            
+            # Check text content, classes, and aria-label
+            is_next_link = bool(
+                NEXT_KEYWORDS_RE.search(link_text) or
+                NEXT_CLASS_RE.search(link_classes) or
+                NEXT_KEYWORDS_RE.search(aria_label)
+            )
+            
+            # Special handling for Material Design and common patterns
+            if ('md-footer__link--next' in link_classes or 
+                'footer' in link_classes or
+                'next' in link_text):
+                is_next_link = True
+            
+            if is_next_link:
+                nav_links.append((absolute_url(url, href), element_text(nav_link).strip()))
+    
+    return title_text, text_content, content_links, next_buttons, nav_links
+
+class BloomFilter:
+    """Fixed-size set of strings or bytes that stores a few bits per item instead of the item.
+
+    Lookups can return a false positive at about error_rate once capacity items
+    have been added (more often beyond that), but never a false negative.
+    """
+    
+    def __init__(self, capacity, error_rate):
+        # An empty crawl (max_pages=0) still needs a usable filter
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+    
+    def _positions(self, item):
+        # Derive all bit positions from one 128-bit digest (Kirsch-Mitzenmacher)
+        if isinstance(item, str):
+            item = item.encode()
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        # Generated lazily, so a lookup that misses stops at the first unset bit
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+    
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+    
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
 class DocScraper:
     def __init__(self, base_url, output_file="output.txt"):
         self.base_url = base_url
         self.output_file = output_file
-        self.visited_urls = set()
-        self.scraped_content = []
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Every page taken off a queue. Checked against each link found, so for long
+        # crawls it is a Bloom filter too, sized to max_pages in scrape_docs.
+        self.visited_urls = None
+        # Every URL ever put on a queue, so links found on many pages are only queued once.
+        # This grows with every link discovered, so it is a Bloom filter sized in scrape_docs.
+        self.enqueued_urls = None
+        # Signatures of every page parsed so far (see PageSignature), also sized in scrape_docs
+        self.seen_content = None
+        # Pages are written to the output file as they are scraped, not held in memory
+        self.output = None
+        self.pages_written = 0
+        
+        # Parsed once here, since every candidate link is checked against it
+        base_parsed = urlparse(base_url)
+        self._base_netloc = base_parsed.netloc
+        self._base_path = base_parsed.path
+        # Only safe as a fast path when the netloc is terminated by a path
+        self._base_prefix = (f"{base_parsed.scheme}://{base_parsed.netloc}{base_parsed.path}"
+                             if base_parsed.path else None)
+        self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
+        }
+        # Created per crawl in scrape_docs, since they must live on the running event loop
+        self.client = None
+        self.semaphore = None
+        self._parse_pool = None
+        self._host_locks = {}
+        # Per-host politeness state: seconds between requests and when the next may start
+        self._crawl_delays = {}
+        self._next_request_time = {}
+        # Successfully scraped pages, kept across runs so reruns resume where they left off.
+        # Each entry is (cached_at, validators, signature, result).
+        self.cache_file = output_file + ".cache"
+        self.cache = None
+        # Validators and signature of pages parsed this run, until extract_cached caches them
+        self._fetched = {}
     
     def is_valid_docs_url(self, url):
+        if self._base_prefix and url.startswith(self._base_prefix):
+            return True
+        parsed = urlparse(url)
+        return (parsed.netloc == self._base_netloc and 
+                parsed.path.startswith(self._base_path))
+    
+    @asynccontextmanager
+    async def request(self, url, headers=None):
+        """Open a GET request within the concurrency limit and yield the response"""
+        async with self.semaphore:
+            # Retry transient server errors with exponential backoff; connection
+            # failures are already retried by the transport
+            for attempt in range(MAX_RETRIES + 1):
+                await self.wait_for_host(url)
+                response = await self.client.send(self.client.build_request('GET', url, headers=headers),
+                                               stream=True)
+                throttled = response.status_code == THROTTLED_STATUS
+                if throttled:
+                    self.slow_down(url, response.headers.get('Retry-After'))
+                if not (throttled or response.status_code in RETRY_STATUSES) or attempt == MAX_RETRIES:
+                    break
+                print(f"  → Status code: {response.status_code}, retrying")
+                await response.aclose()
+                # A throttled retry waits in wait_for_host instead
+                if not throttled:
+                    await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+            
+            try:
+                print(f"  → Status code: {response.status_code}")
+                if response.status_code != NOT_MODIFIED_STATUS:
+                    response.raise_for_status()
+                yield response
+            finally:
+                await response.aclose()
+    
+    async def wait_for_host(self, url):
+        """Wait until the host's crawl delay allows another request, then reserve the next slot"""
+        host = urlparse(url).netloc
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host not in self._crawl_delays:
+                self._crawl_delays[host] = await self.fetch_crawl_delay(url)
+            
+            # Be respectful to the server
+            wait = self._next_request_time.get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_request_time[host] = (time.monotonic() + self._crawl_delays[host] +
+                                             random.uniform(0, CRAWL_JITTER))
+    
+    def slow_down(self, url, retry_after):
+        """Back off from a host that answered 429 Too Many Requests"""
+        host = urlparse(url).netloc
+        # Floored at the default delay, since doubling a Crawl-delay of 0 would leave it at 0
+        delay = min(MAX_CRAWL_DELAY, max(DEFAULT_CRAWL_DELAY, self._crawl_delays[host] * 2))
+        self._crawl_delays[host] = delay
+        # Retry-After may also be an HTTP date; the new crawl delay stands in for it then
+        try:
+            pause = min(MAX_CRAWL_DELAY, max(DEFAULT_CRAWL_DELAY, float(retry_after)))
+        except (TypeError, ValueError):
+            pause = delay
+        print(f"  → Throttled by {host}, crawl delay now {delay}s")
+        self._next_request_time[host] = max(self._next_request_time.get(host, 0),
+                                            time.monotonic() + pause)
+    
+    async def fetch_crawl_delay(self, url):
+        """Read the Crawl-Delay for our user agent from the host's robots.txt"""
         parsed = urlparse(url)
-        base_parsed = urlparse(self.base_url)
-        return (parsed.netloc == base_parsed.netloc and 
-                parsed.path.startswith(base_parsed.path))
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        robots = RobotFileParser(robots_url)
+        try:
+            response = await self.client.get(robots_url)
+            if response.status_code != 200:
+                return DEFAULT_CRAWL_DELAY
+            robots.parse(response.text.splitlines())
+        except Exception as e:
+            print(f"  → Could not read {robots_url}: {e}")
+            return DEFAULT_CRAWL_DELAY
+        
+        delay = robots.crawl_delay(self.headers['User-Agent'])
+        if delay is None:
+            return DEFAULT_CRAWL_DELAY
+        print(f"  → Using Crawl-Delay of {delay}s from {robots_url}")
+        return float(delay)
     
-    def extract_content(self, url):
+    async def extract_content(self, url, validators=None):
         try:
             print(f"  → Requesting URL: {url}")
-            response = self.session.get(url, timeout=10)
-            print(f"  → Status code: {response.status_code}")
-            print(f"  → Content length: {len(response.text)}")
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Check if this is a JavaScript-rendered docs site
-            if '<elements-api' in response.text:
-                print(f"  → Detected Stoplight Elements (JavaScript-based docs)")
-                return self.extract_from_openapi(url)
-            
-            # Remove navigation, footers, and other non-content elements
-            for element in soup.find_all(['nav', 'footer', 'aside', 'script', 'style']):
-                element.decompose()
-            
-            # Remove promotional content (if any)
-            for element in soup.find_all(string=lambda text: text and "Stay organized with collections" in text):
-                parent = element.parent
-                while parent and parent.name != 'body':
-                    if parent.get_text().strip().startswith("Stay organized with collections"):
-                        parent.decompose()
+            is_stoplight = False
+            async with self.request(url, validators) as response:
+                if response.status_code == NOT_MODIFIED_STATUS:
+                    # Only an answer to our own validators says the cached copy is current
+                    if validators:
+                        return NOT_MODIFIED
+                    print(f"  → Unexpected 304 for an unconditional request")
+                    return FETCH_FAILED
+                new_validators = {request_header: response.headers[header]
+                                  for header, request_header in VALIDATOR_HEADERS
+                                  if header in response.headers}
+                
+                # Skip PDFs, images, archives and other assets without downloading the body
+                content_type = response.headers.get('Content-Type', '')
+                if content_type and 'html' not in content_type:
+                    print(f"  → Skipping non-HTML content: {content_type}")
+                    return None, [], []
+                # Likewise oversized pages, when the server declares the length. That is
+                # the encoded size, and a compressed body only grows once decoded.
+                declared_length = response.headers.get('Content-Length', '')
+                if declared_length.isdigit() and int(declared_length) > MAX_PAGE_BYTES:
+                    print(f"  → Page exceeds {MAX_PAGE_BYTES} bytes, skipping")
+                    return None, [], []
+                
+                encoding = response.charset_encoding
+                chunks = []
+                page_hash = PageSignature()
+                content_length = 0
+                has_promo = False
+                tail = b''
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    # Check if this is a JavaScript-rendered docs site
+                    if contains_marker(STOPLIGHT_MARKER, tail, chunk):
+                        is_stoplight = True
                         break
-                    parent = parent.parent
-            
-            # Find main content area
-            content_area = (soup.find('main') or 
-                          soup.find('article') or 
-                          soup.find(class_=lambda x: x and 'content' in x.lower()) or
-                          soup.find('body'))
-            
-            print(f"  → Content area found: {content_area.name if content_area else None}")
-            
-            if not content_area:
+                    has_promo = has_promo or contains_marker(PROMO_MARKER, tail, chunk)
+                    tail = chunk[-MARKER_OVERLAP:]
+                    content_length += len(chunk)
+                    if content_length > MAX_PAGE_BYTES:
+                        print(f"  → Page exceeds {MAX_PAGE_BYTES} bytes, skipping")
+                        return None, [], []
+                    chunks.append(chunk)
+                    page_hash.update(chunk)
+            
+            if is_stoplight:
+                print(f"  → Detected Stoplight Elements (JavaScript-based docs)")
+                return await self.extract_from_openapi(url)
+            
+            print(f"  → Content length: {content_length}")
+            # The filter is checked and updated on the loop with no await in between, so
+            # two workers can't both claim the same content
+            signature = page_hash.digest()
+            if signature in self.seen_content:
+                print(f"  → Same content as an earlier page, skipping")
+                return None, [], []
+            self.seen_content.add(signature)
+            # Parse on the worker pool so the event loop keeps other downloads moving
+            page = await asyncio.get_running_loop().run_in_executor(
+                self._parse_pool, parse_page, url, chunks, encoding, has_promo)
+            if page is None:
                 return None, []
-                
-            # Extract text content
-            title = soup.find('h1')
-            title_text = title.get_text().strip() if title else url
-            
-            # Get all text content, preserving some structure
-            text_content = []
-            elements = content_area.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'td', 'pre', 'code'])
-            print(f"  → Found {len(elements)} content elements")
-            
-            for elem in elements:
-                text = elem.get_text().strip()
-                if text and len(text) > 10:  # Filter out very short text
-                    if elem.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                        text_content.append(f"\n{'#' * int(elem.name[1])} {text}\n")
-                    else:
-                        text_content.append(text)
+            title_text, text_content, content_links, next_buttons, nav_links = page
             
-            print(f"  → Extracted {len(text_content)} text blocks")
-            
-            # Separate regular links from navigation links
-            regular_links = []
-            next_links = []
+            # Check each distinct URL against the crawl once; the lists below are then
+            # filtered with set lookups, keeping their order
+            candidates = set(content_links)
+            candidates.update(next_buttons)
+            candidates.update(full_url for full_url, _ in nav_links)
+            wanted = {full_url for full_url in candidates
+                      if self.is_valid_docs_url(full_url) and full_url not in self.visited_urls}
             
             # Find regular links to other docs pages
-            for link in content_area.find_all('a', href=True):
-                href = link['href']
-                full_url = urljoin(url, href)
-                if self.is_valid_docs_url(full_url) and full_url not in self.visited_urls:
-                    regular_links.append(full_url)
+            regular_links = [full_url for full_url in content_links if full_url in wanted]
             
-            # Also look for Next buttons and pagination links in the entire page
-            next_buttons = soup.find_all('a', href=True, string=lambda text: text and 'next' in text.lower())
-            for button in next_buttons:
-                href = button['href']
-                full_url = urljoin(url, href)
-                if self.is_valid_docs_url(full_url) and full_url not in self.visited_urls and full_url not in regular_links:
+            # Separate navigation links from regular links
+            wanted.difference_update(regular_links)
+            next_links = []
+            for full_url in next_buttons:
+                if full_url in wanted:
                     next_links.append(full_url)
                     print(f"  → Found Next button: {full_url}")
             
-            # Look for navigation arrows and buttons with specific classes/attributes
-            nav_selectors = [
-                'a[aria-label*="next"]',
-                'a[aria-label*="Next"]',
-                'a[class*="next"]',
-                'a[class*="pagination"]',
-                '.next a',
-                '.pagination a',
-                '[class*="nav"] a',
-                # Footer navigation patterns
-                'nav[class*="footer"] a',
-                '.md-footer a',
-                'footer nav a',
-                'footer a',
-                # Material Design footer patterns
-                '.md-footer__link--next',
-                'a.md-footer__link--next',
-                # Generic footer navigation
-                '[class*="footer"] a[class*="next"]',
-                '[class*="footer"] a[aria-label*="next"]',
-                '[class*="footer"] a[aria-label*="Next"]',
-                # Documentation navigation patterns
-                '.doc-nav a',
-                '.docs-nav a',
-                '.page-nav a',
-                '[class*="page-navigation"] a',
-                '[class*="doc-navigation"] a'
-            ]
-            
-            for selector in nav_selectors:
-                try:
-                    nav_links = soup.select(selector)
-                    for nav_link in nav_links:
-                        if nav_link.get('href'):
-                            href = nav_link['href']
-                            full_url = urljoin(url, href)
-                            if self.is_valid_docs_url(full_url) and full_url not in self.visited_urls and full_url not in regular_links and full_url not in next_links:
-                                # Check if this looks like a next/forward navigation
-                                link_text = nav_link.get_text().strip().lower()
-                                link_classes = str(nav_link.get('class', [])).lower()
-                                aria_label = nav_link.get('aria-label', '').lower()
-                                
-                                # Keywords for next/forward navigation
-                                next_keywords = ['next', '→', '>', 'continue', 'forward', 'siguiente']
-                                
-                                # Check text content, classes, and aria-label
-                                is_next_link = (
-                                    any(keyword in link_text for keyword in next_keywords) or
-                                    any(keyword in link_classes for keyword in ['next', 'forward']) or
-                                    any(keyword in aria_label for keyword in next_keywords) or
-                                    'next' in aria_label
-                                )
-                                
-                                # Special handling for Material Design and common patterns
-                                if ('md-footer__link--next' in link_classes or 
-                                    'footer' in link_classes or
-                                    nav_link.find(string=lambda text: text and 'next' in text.lower())):
-                                    is_next_link = True
-                                
-                                if is_next_link:
-                                    next_links.append(full_url)
-                                    print(f"  → Found navigation link: {full_url} (text: '{nav_link.get_text().strip()}')")
-                except Exception as e:
-                    # Continue if CSS selector fails
-                    continue
+            wanted.difference_update(next_links)
+            for full_url, link_text in nav_links:
+                if full_url in wanted:
+                    wanted.discard(full_url)
+                    next_links.append(full_url)
+                    print(f"  → Found navigation link: {full_url} (text: '{link_text}')")
             
             # Return next links first for sequential navigation, then regular links
             all_links = next_links + regular_links
             
+            # Only a page parsed from this response may be replayed when it comes back
+            # unchanged; a Stoplight page's content comes from its spec instead
+            self._fetched[url] = (new_validators, signature)
             return title_text, text_content, all_links
             
         except Exception as e:
             print(f"Error scraping {url}: {e}")
-            return None, [], []
+            return failed_result(e)
     
-    def extract_from_openapi(self, base_url):
+    async def extract_from_openapi(self, base_url):
         """Extract content from OpenAPI JSON specification"""
         try:
             # Try to get the OpenAPI spec
@@ -185,11 +631,11 @@ class DocScraper:
             openapi_url = f"{parsed_base.scheme}://{parsed_base.netloc}/api/v3/openapi.json"
             
             print(f"  → Fetching OpenAPI spec: {openapi_url}")
-            response = self.session.get(openapi_url, timeout=10)
-            response.raise_for_status()
+            async with self.request(openapi_url) as response:
+                body = await response.aread()
             
             import json
-            spec = json.loads(response.text)
+            spec = json.loads(body)
             
             # Extract title and description
             title = spec.get('info', {}).get('title', 'API Documentation')
@@ -203,31 +649,33 @@ class DocScraper:
                 content_blocks.append(description)
             
             # Extract paths/endpoints
+            # One content block per path, built as a list of lines and joined once
             paths = spec.get('paths', {})
             for path, methods in paths.items():
-                content_blocks.append(f"\n## {path}")
+                lines = [f"\n## {path}"]
                 
                 for method, details in methods.items():
                     if isinstance(details, dict):
                         summary = details.get('summary', '')
                         description = details.get('description', '')
                         
-                        content_blocks.append(f"\n### {method.upper()} {path}")
+                        lines.append(f"\n### {HTTP_METHODS.get(method) or method.upper()} {path}")
                         if summary:
-                            content_blocks.append(summary)
+                            lines.append(summary)
                         if description:
-                            content_blocks.append(description)
+                            lines.append(description)
                             
                         # Add parameters
                         parameters = details.get('parameters', [])
                         if parameters:
-                            content_blocks.append("\nParameters:")
-                            for param in parameters:
-                                param_name = param.get('name', '')
-                                param_desc = param.get('description', '')
-                                param_required = param.get('required', False)
-                                required_text = ' (required)' if param_required else ''
-                                content_blocks.append(f"- {param_name}{required_text}: {param_desc}")
+                            lines.append("\nParameters:")
+                            lines.extend(
+                                f"- {param.get('name', '')}{' (required)' if param.get('required', False) else ''}: "
+                                f"{param.get('description', '')}"
+                                for param in parameters
+                            )
+                
+                content_blocks.append("\n".join(lines))
             
             # Get links to other documentation pages if any
             changelog_url = f"{parsed_base.scheme}://{parsed_base.netloc}/docs/v3/changelog"
@@ -237,87 +685,182 @@ class DocScraper:
             
         except Exception as e:
             print(f"  → Error extracting from OpenAPI: {e}")
-            return None, [], []
+            return failed_result(e)
             
         except Exception as e:
             print(f"Error scraping {url}: {e}")
             return None, [], []
     
-    def scrape_docs(self, max_pages=1000):
+    async def scrape_docs(self, max_pages=1000):
         # Use two queues: priority queue for next/navigation links, regular queue for other links
         priority_queue = deque([self.base_url])
         regular_queue = deque()
         page_count = 0
+        in_flight = 0
+        self.visited_urls = BloomFilter(max_pages, VISITED_ERROR_RATE)
+        self.enqueued_urls = BloomFilter(max_pages * EXPECTED_LINKS_PER_PAGE, ENQUEUED_ERROR_RATE)
+        self.enqueued_urls.add(self.base_url)
+        self.seen_content = BloomFilter(max_pages, SEEN_CONTENT_ERROR_RATE)
         
-        while (priority_queue or regular_queue) and page_count < max_pages:
-            # Always prioritize navigation links over regular links
-            if priority_queue:
-                url = priority_queue.popleft()
-                queue_type = "PRIORITY"
-            else:
-                url = regular_queue.popleft()
-                queue_type = "REGULAR"
-            
-            if url in self.visited_urls:
-                continue
-                
-            print(f"Scraping ({page_count + 1}/{max_pages}) [{queue_type}]: {url}")
-            self.visited_urls.add(url)
-            
-            result = self.extract_content(url)
-            if len(result) == 3:
-                title, content, links = result
-            else:
-                title, content = result
-                links = []
-            
-            if content:
-                self.scraped_content.append({
-                    'url': url,
-                    'title': title,
-                    'content': content
-                })
-                print(f"  → Scraped content: {len(content)} blocks")
+        # Pages scraped by earlier runs are replayed from the cache instead of re-fetched.
+        # Parse workers are spawned, not forked: a fork would copy the event loop's
+        # threads and any output still sitting in stdout's buffer.
+        with shelve.open(self.cache_file) as cache, \
+             open(self.output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as output, \
+             ProcessPoolExecutor(max_workers=PARSE_WORKERS,
+                                 mp_context=multiprocessing.get_context('spawn')) as parse_pool:
+            self.cache = cache
+            self.output = output
+            self._parse_pool = parse_pool
+            self.pages_written = 0
+            output.write("Doc-Fetcher API Documentation\n" + SEP)
+            
+            # One HTTP/2 client for the whole crawl, so requests to a host are multiplexed
+            # over a single kept-alive connection. httpx sends Accept-Encoding for every
+            # decoder installed (gzip, deflate, and br via the brotli extra) and
+            # decompresses incrementally as chunks are streamed to the parser.
+            limits = httpx.Limits(max_connections=CONCURRENCY, keepalive_expiry=30)
+            transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=MAX_RETRIES)
+            async with httpx.AsyncClient(transport=transport, headers=self.headers,
+                                         timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
+                self.client = client
+                self.semaphore = asyncio.Semaphore(CONCURRENCY)
+                self._host_locks = {}
+                frontier_changed = asyncio.Condition()
                 
-                # Add new links to appropriate queues
-                # First few links are next/navigation links (returned first from extract_content)
-                next_link_count = 0
-                for i, link in enumerate(links):
-                    if link not in self.visited_urls:
-                        # First 2-3 links are likely next/navigation links based on our prioritization
-                        if i < 3 and any(indicator in link.lower() for indicator in ['next', 'plan', 'step', 'part']):
-                            priority_queue.append(link)
-                            print(f"  → Added to priority queue: {link}")
-                            next_link_count += 1
-                        else:
-                            regular_queue.append(link)
-                            print(f"  → Added to regular queue: {link}")
-                
-                if next_link_count > 0:
-                    print(f"  → Found {next_link_count} navigation links to prioritize")
-            else:
-                print(f"  → No content found on this page")
-            
-            page_count += 1
-            time.sleep(1)  # Be respectful to the server
-    
-    def save_to_file(self):
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            f.write("Doc-Fetcher API Documentation\n")
-            f.write("=" * 50 + "\n\n")
-            
-            for page in self.scraped_content:
-                f.write(f"URL: {page['url']}\n")
-                f.write(f"Title: {page['title']}\n")
-                f.write("-" * 50 + "\n")
-                
-                for content_block in page['content']:
-                    f.write(content_block + "\n")
+                async def worker():
+                    # Each worker takes the next URL as soon as its previous page is done,
+                    # so one slow page never holds up the others
+                    nonlocal page_count, in_flight
+                    while True:
+                        async with frontier_changed:
+                            # Wait for a queued URL, unless the crawl is over: the page limit
+                            # is reached, or nothing is queued and no page can add more
+                            await frontier_changed.wait_for(
+                                lambda: priority_queue or regular_queue or not in_flight)
+                            if page_count >= max_pages or not (priority_queue or regular_queue):
+                                frontier_changed.notify_all()
+                                return
+                            
+                            # Always prioritize navigation links over regular links
+                            if priority_queue:
+                                url = priority_queue.popleft()
+                                queue_type = "PRIORITY"
+                            else:
+                                url = regular_queue.popleft()
+                                queue_type = "REGULAR"
+                            
+                            if url in self.visited_urls:
+                                continue
+                            
+                            page_count += 1
+                            in_flight += 1
+                            print(f"Scraping ({page_count}/{max_pages}) [{queue_type}]: {url}")
+                            self.visited_urls.add(url)
+                        
+                        try:
+                            result = await self.extract_cached(url)
+                            async with frontier_changed:
+                                self.process_result(url, result, priority_queue, regular_queue)
+                        finally:
+                            # Even if this page failed, let idle workers re-check for the end
+                            async with frontier_changed:
+                                in_flight -= 1
+                                frontier_changed.notify_all()
                 
-                f.write("\n" + "=" * 50 + "\n\n")
+                await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
         
         print(f"Documentation saved to {self.output_file}")
-        print(f"Scraped {len(self.scraped_content)} pages")
+        print(f"Scraped {self.pages_written} pages")
+    
+    async def extract_cached(self, url):
+        """Return a page from the resume cache, fetching and caching it on a miss.
+
+        Entries older than CACHE_FRESH_FOR are requested again with the validators
+        saved alongside them, and replayed if the server answers 304 Not Modified or
+        the request fails without the server saying the page is gone.
+        """
+        entry = self.cache.get(url)
+        validators = None
+        cached = None
+        # Entries written before validators were saved hold only the result; refetch those
+        if entry is not None and len(entry) == 4:
+            cached_at, validators, signature, cached = entry
+            if time.time() - cached_at < CACHE_FRESH_FOR:
+                print(f"  → Loaded from cache: {url}")
+                return self.replay_cached(signature, cached)
+        
+        result = await self.extract_content(url, validators)
+        if result is NOT_MODIFIED and cached is not None:
+            print(f"  → Not modified, loaded from cache: {url}")
+            self.cache[url] = (time.time(), validators, signature, cached)
+            self.cache.sync()
+            return self.replay_cached(signature, cached)
+        if result is FETCH_FAILED or result is NOT_MODIFIED:
+            if cached is None:
+                return None, [], []
+            # Left stale, so the next run tries to revalidate it again
+            print(f"  → Request failed, loaded from cache: {url}")
+            return self.replay_cached(signature, cached)
+        
+        new_validators, signature = self._fetched.pop(url, ({}, None))
+        if len(result) == 3 and result[1]:
+            self.cache[url] = (time.time(), new_validators, signature, result)
+            self.cache.sync()
+        elif entry is not None:
+            # The server answered but no longer serves usable content here (e.g. 404/410),
+            # so a later failed request mustn't replay the old copy
+            del self.cache[url]
+            self.cache.sync()
+        return result
+    
+    def replay_cached(self, signature, result):
+        """Return a cached page's result, unless this run has already seen its content"""
+        # Stoplight pages have no signature, since their content comes from the spec
+        if signature is not None:
+            if signature in self.seen_content:
+                print(f"  → Same content as an earlier page, skipping")
+                return None, [], []
+            self.seen_content.add(signature)
+        return result
+    
+    def process_result(self, url, result, priority_queue, regular_queue):
+        if len(result) == 3:
+            title, content, links = result
+        else:
+            title, content = result
+            links = []
+        
+        if content:
+            self.write_page(url, title, content)
+            print(f"  → Scraped content: {len(content)} blocks")
+            
+            # Add new links to appropriate queues
+            # First few links are next/navigation links (returned first from extract_content)
+            next_link_count = 0
+            for i, link in enumerate(links):
+                if link not in self.enqueued_urls:
+                    self.enqueued_urls.add(link)
+                    # First 2-3 links are likely next/navigation links based on our prioritization
+                    if i < 3 and PRIORITY_URL_RE.search(link):
+                        priority_queue.append(link)
+                        print(f"  → Added to priority queue: {link}")
+                        next_link_count += 1
+                    else:
+                        regular_queue.append(link)
+                        print(f"  → Added to regular queue: {link}")
+            
+            if next_link_count > 0:
+                print(f"  → Found {next_link_count} navigation links to prioritize")
+        else:
+            print(f"  → No content found on this page")
+    
+    def write_page(self, url, title, content):
+        """Append one page to the output file, built in memory and written in one call"""
+        # content is never empty here, so one join gives every block its own line
+        self.output.write(f"URL: {url}\nTitle: {title}\n{RULE}" +
+                          "\n".join(content) + "\n\n" + SEP)
+        self.pages_written += 1
 
 def main():
     target_url = "https://ads-api.reddit.com/docs/v3/"
@@ -330,8 +873,7 @@ def main():
         pass
     
     scraper = DocScraper(target_url, "docs.txt")
-    scraper.scrape_docs()
-    scraper.save_to_file()
+    asyncio.run(scraper.scrape_docs())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file